@@ -0,0 +1,127 @@
+from threading import Semaphore
+
+import attr
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np  # noqa
+    from typing import Any, Dict, Iterator, List, Union  # noqa
+
+
+@attr.attrs(slots=True)
+class ChunkRing(object):
+    """
+    A fixed-size ring of preallocated audio chunks, written by a single producer thread
+    and read by a single consumer thread (the PyAudio callback).
+
+    Each side only ever moves its own index. The two semaphores count free and filled
+    slots, so neither side needs to take a shared lock to check the other's progress.
+
+    Chunks are handed out as read-only views of their slot rather than copies, so the
+    ring allocates nothing once it is built. A slot is only handed back to the producer
+    on the consumer's next `get`, by which time PyAudio has copied it out.
+    """
+    num_slots = attr.attrib()        # type: int
+    chunk_num_bytes = attr.attrib()  # type: int
+
+    _slots = attr.attrib(init=False, repr=False)         # type: List[bytearray]
+    _views = attr.attrib(init=False, repr=False)         # type: List[memoryview]
+    _head = attr.attrib(init=False)                      # type: int
+    _tail = attr.attrib(init=False)                      # type: int
+    _free_slots = attr.attrib(init=False, repr=False)    # type: Semaphore
+    _filled_slots = attr.attrib(init=False, repr=False)  # type: Semaphore
+    _is_holding = attr.attrib(init=False)                # type: bool
+
+    def __attrs_post_init__(self, *args, **kwargs):
+        # type: (*List[Any],  **Dict[Any]) -> None
+        # one extra slot for the chunk the consumer is still holding
+        num_slots = self.num_slots + 1
+        self._slots = [bytearray(self.chunk_num_bytes) for _ in range(num_slots)]
+        self._views = [memoryview(slot).toreadonly() for slot in self._slots]
+        self._head = 0
+        self._tail = 0
+        self._free_slots = Semaphore(num_slots)
+        self._filled_slots = Semaphore(0)
+        self._is_holding = False
+
+    def put(self, chunk):
+        """
+        Copy a chunk into the next free slot, blocking while the ring is full.
+        Any contiguous buffer is accepted, so a reused NumPy array can be copied in
+        directly without first packing it into a new bytes object.
+        """
+        # type: (Union[bytes, np.ndarray]) -> None
+        self._free_slots.acquire()
+        self._slots[self._head][:] = memoryview(chunk).cast('B')
+        self._head = (self._head + 1) % len(self._slots)
+        self._filled_slots.release()
+
+    def get(self):
+        """
+        Return a read-only view of the oldest filled chunk, blocking while the ring is
+        empty. The view is only valid until the next call to `get`.
+        """
+        # type: () -> memoryview
+        self._filled_slots.acquire()
+        chunk = self._views[self._tail]
+        self._tail = (self._tail + 1) % len(self._slots)
+
+        # the previous chunk has been consumed, so its slot can be refilled
+        if self._is_holding:
+            self._free_slots.release()
+        self._is_holding = True
+        return chunk
+
+
+@attr.attrs(slots=True)
+class EventRing(object):
+    """
+    A fixed-size, non-blocking ring of events, written by a single producer thread (e.g.
+    the keyboard) and drained by a single consumer thread (the sample generator).
+
+    The producer only ever writes `_tail` and the consumer only ever writes `_head`. Each
+    slot is filled before the index that publishes it is moved, and under the GIL a
+    single attribute assignment is atomic, so neither side needs a lock.
+    """
+    capacity = attr.attrib()  # type: int
+
+    _slots = attr.attrib(init=False, repr=False)  # type: List[Any]
+    _head = attr.attrib(init=False)               # type: int
+    _tail = attr.attrib(init=False)               # type: int
+
+    def __attrs_post_init__(self, *args, **kwargs):
+        # type: (*List[Any],  **Dict[Any]) -> None
+        # one slot is always left empty to tell a full ring apart from an empty one
+        self._slots = [None] * (self.capacity + 1)
+        self._head = 0
+        self._tail = 0
+
+    def __len__(self):
+        # type: () -> int
+        return (self._tail - self._head) % len(self._slots)
+
+    def put(self, event):
+        """
+        Publish an event. Returns False, dropping the event, if the ring is full.
+        """
+        # type: (Any) -> bool
+        next_tail = (self._tail + 1) % len(self._slots)
+        if next_tail == self._head:
+            return False
+        self._slots[self._tail] = event
+        self._tail = next_tail
+        return True
+
+    def drain(self):
+        """
+        Yield every event published so far, oldest first.
+        """
+        # type: () -> Iterator[Any]
+        head = self._head
+        tail = self._tail
+        while head != tail:
+            event = self._slots[head]
+            self._slots[head] = None
+            head = (head + 1) % len(self._slots)
+            self._head = head
+            yield event
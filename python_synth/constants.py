@@ -1,9 +1,9 @@
-import pyaudio
+from enum import IntEnum
 
-from python_synth.settings import SAMPLE_BIT_DEPTH
+import numpy as np
 
+from python_synth.settings import SAMPLE_BIT_DEPTH
 
-PYAUDIO = pyaudio.PyAudio()
 
 BITS_PER_BYTE = 8
 
@@ -22,31 +22,50 @@ LETTER_TO_MIDI_NOTE_MAP = {
     'B': 71,
 }
 
-NOTE_EVENTS = {
-    'NOTE_ON': 0,
-    'NOTE_OFF': 1,
-}
+# IntEnums keep the NOTE_EVENTS['NOTE_ON'] style lookup by name, and their members are
+# ints, so hot paths compare against module-level bindings of them with int equality
+NOTE_EVENTS = IntEnum('NOTE_EVENTS', [
+    ('NOTE_ON', 0),
+    ('NOTE_OFF', 1),
+])
 
-KEY_STATUS = {
-    'KEY_UP': 0,
-    'KEY_DOWN': 1,
-}
+KEY_STATUS = IntEnum('KEY_STATUS', [
+    ('KEY_UP', 0),
+    ('KEY_DOWN', 1),
+])
 
-ADSR_STATUS = {
-    'OFF': 0,
-    'ATTACK': 1,
-    'DECAY': 2,
-    'SUSTAIN': 3,
-    'RELEASE': 4,
-}
+ADSR_STATUS = IntEnum('ADSR_STATUS', [
+    ('OFF', 0),
+    ('ATTACK', 1),
+    ('DECAY', 2),
+    ('SUSTAIN', 3),
+    ('RELEASE', 4),
+])
+
+NOTE_ON, NOTE_OFF = NOTE_EVENTS
+KEY_UP, KEY_DOWN = KEY_STATUS
+ADSR_OFF, ADSR_ATTACK, ADSR_DECAY, ADSR_SUSTAIN, ADSR_RELEASE = ADSR_STATUS
+
+# MIDI note numbers are 7-bit, so every note's frequency can be computed up front
+# http://glassarmonica.com/science/frequency_midi.php
+MIDI_NOTE_MIN = 0
+MIDI_NOTE_MAX = 127
+MIDI_FREQUENCIES = tuple(
+    27.5 * (2 ** ((midi_note - 21) / 12))
+    for midi_note in range(MIDI_NOTE_MIN, MIDI_NOTE_MAX + 1)
+)
 
 # an "analogue" is an instrument setting that varies within a range e.g. velocity
 # it's called an "analogue" because its use mimics an analogue dial or signal
 ANALOGUE_MIN = 0
 ANALOGUE_MAX = 255
+# per-sample volumes are analogues too, so a byte holds each one exactly
+VOLUME_DTYPE = np.dtype('uint8')
 
-AMPLITUDE_MIN = SAMPLE_BIT_DEPTH // -2
-AMPLITUDE_MAX = SAMPLE_BIT_DEPTH // 2
+# samples are signed integers centred on zero, which is silence
+AMPLITUDE_MIN = -(2 ** (SAMPLE_BIT_DEPTH - 1))
+AMPLITUDE_MAX = 2 ** (SAMPLE_BIT_DEPTH - 1) - 1
+SAMPLE_DTYPE = np.dtype('int{}'.format(SAMPLE_BIT_DEPTH))
 
 # SDL enforces a maximum queue size that must be respected
-SAMPLE_BYTE_WIDTH = SAMPLE_BIT_DEPTH / BITS_PER_BYTE
+SAMPLE_BYTE_WIDTH = SAMPLE_BIT_DEPTH // BITS_PER_BYTE
@@ -1,97 +1,96 @@
 # coding: utf-8
-from __future__ import division
-
-from functools import wraps
+import os
+import sys
+from functools import lru_cache
 from threading import Thread
 
+import numpy as np
 import pyaudio
-import six
-from six import PY2
-from six.moves import queue
-
 
 from python_synth import constants
+from python_synth.buffers import ChunkRing
 from python_synth.settings import AUDIO_STREAM_CHUNK_SIZE, BUFFER_MS, SAMPLES_PER_SECOND
 
 
-def simple_cache(func):
-    # type: (Callable[*Any, **Any]) -> Callable[*Any, **Any]
-    """
-    A simple (i.e. stupid) unbounded cache.
-    Raises TypeError if any argument is unhashable.
-    """
-    cache = {}
-
-    @wraps(func)
-    def decorated_function(*args, **kwargs):
-        # type: (*Any, **Any) -> Any
-        cache_key = 0
-
-        # stupidly generate a "unique" cache key from arguments
-        for arg in args:
-            cache_key += hash(arg)
-        for _, kwarg in six.iteritems(kwargs):
-            cache_key += hash(kwarg)
-
-        # return value from cache if available
-        if cache.get(cache_key):
-            return cache[cache_key]
-
-        # store value in cache before returning
-        return_value = func(*args, **kwargs)
-        cache[cache_key] = return_value
-        return return_value
-
-    return decorated_function
-
-
-def get_samples(sample_generator, num_samples):
-    # type: (Iterable[int], int) -> Iterator[int]
-    for _ in range(num_samples):
-        sample_amplitude = next(sample_generator)
-        yield sample_amplitude
+# https://docs.microsoft.com/en-us/windows/desktop/api/processthreadsapi/nf-processthreadsapi-setthreadpriority
+WINDOWS_THREAD_PRIORITY_TIME_CRITICAL = 15
 
 
-def fill_buffer(buf, sample_generator, chunk_size):
-    # type: (queue.Queue, int) -> None
-    while True:
-        sample_iterator = get_samples(sample_generator, chunk_size)
-        if PY2:
-            chunk = ''.join(chr(sample) for sample in sample_iterator)
-        else:
-            chunk = bytes(sample_iterator)
-        buf.put(chunk, block=True)
+def raise_thread_priority():
+    # type: () -> bool
+    """
+    Try to give the calling thread real-time scheduling priority, so that audio isn't
+    starved by the UI thread. Returns False if the platform is unsupported or refuses
+    (e.g. Linux without CAP_SYS_NICE), in which case the priority is unchanged.
+    """
+    if hasattr(os, 'sched_setscheduler'):
+        try:
+            priority = os.sched_get_priority_min(os.SCHED_FIFO)
+            # pid 0 is the calling thread
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+        except OSError:
+            return False
+        return True
+
+    if sys.platform == 'win32':
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        thread_handle = kernel32.GetCurrentThread()
+        priority = WINDOWS_THREAD_PRIORITY_TIME_CRITICAL
+        return bool(kernel32.SetThreadPriority(thread_handle, priority))
+
+    return False
+
+
+def fill_buffer(buf, sample_generator):
+    # type: (ChunkRing, Iterator[np.ndarray]) -> None
+    raise_thread_priority()
+    for chunk in sample_generator:
+        buf.put(chunk)
+
+
+@lru_cache(maxsize=None)
+def get_pyaudio():
+    # type: () -> pyaudio.PyAudio
+    """
+    Return the process-wide PyAudio instance, initializing PortAudio on first use
+    rather than whenever the constants module happens to be imported.
+    """
+    return pyaudio.PyAudio()
 
 
 def get_pyaudio_stream(
     samples_per_second,  # type: int
     sample_byte_width,   # type: int
     num_audio_channels,  # type: int
-    sample_generator,    # type: Callable[Iterator]
+    sample_generator,    # type: Callable[[int], Iterator[np.ndarray]]
 ):
     # type: (...) -> pyaudio.Stream
-    sample_generator = sample_generator()
+    sample_generator = sample_generator(AUDIO_STREAM_CHUNK_SIZE)
 
-    buffer_samples = int(SAMPLES_PER_SECOND * (BUFFER_MS / 1000.0)) or 1
+    buffer_samples = (SAMPLES_PER_SECOND * BUFFER_MS // 1000) or 1
     buffer_chunks = (buffer_samples // AUDIO_STREAM_CHUNK_SIZE) or 1
-    chunk_buffer = queue.Queue(maxsize=buffer_chunks)
+    chunk_num_bytes = AUDIO_STREAM_CHUNK_SIZE * sample_byte_width * num_audio_channels
+    chunk_buffer = ChunkRing(buffer_chunks, chunk_num_bytes)
 
     # populate buffer in a separate thread
     thread = Thread(
         target=fill_buffer,
-        args=(chunk_buffer, sample_generator, AUDIO_STREAM_CHUNK_SIZE),
+        args=(chunk_buffer, sample_generator),
     )
     thread.daemon = True
     thread.start()
 
     def stream_callback(_, num_samples, *args):
-        # type: (None, int, *Any) -> Tuple[bytes, int]
-        chunk = chunk_buffer.get(block=True)
-        return (chunk, pyaudio.paContinue)
+        # type: (None, int, *Any) -> Tuple[memoryview, int]
+        # PyAudio accepts any read-only buffer and copies it out before returning, so
+        # the chunk can be passed straight from its slot without allocating a copy
+        return (chunk_buffer.get(), pyaudio.paContinue)
 
-    stream = constants.PYAUDIO.open(
+    audio = get_pyaudio()
+    stream = audio.open(
         rate=samples_per_second,
-        format=constants.PYAUDIO.get_format_from_width(sample_byte_width),
+        format=audio.get_format_from_width(sample_byte_width),
         channels=num_audio_channels,
         output=True,
         stream_callback=stream_callback,
@@ -100,15 +99,34 @@ def get_pyaudio_stream(
     return stream
 
 
-@simple_cache
+def fast_sin(radians):
+    # type: (np.ndarray) -> np.ndarray
+    """
+    Approximate np.sin with a degree-9 Taylor polynomial evaluated in Horner form,
+    which is a handful of multiply-adds with no libm call. Input is folded into
+    [-pi/2, pi/2], where the max absolute error is about 4e-6 (~0.1 LSB at 16 bits).
+    """
+    # wrap input into [-pi, pi) then reflect about +/-pi/2, since sin(x) = sin(pi - x)
+    radians = (radians + np.pi) % (2 * np.pi) - np.pi
+    radians = np.where(
+        np.abs(radians) > np.pi / 2,
+        np.copysign(np.pi, radians) - radians,
+        radians,
+    )
+    squared = radians * radians
+    return radians * (1 + squared * (
+        -1 / 6 + squared * (1 / 120 + squared * (-1 / 5040 + squared / 362880))
+    ))
+
+
 def midi_note_to_frequency(midi_note):
     # type: (int) -> float
-    # http://glassarmonica.com/science/frequency_midi.php
-    frequency_hertz = 27.5 * (2 ** ((midi_note - 21) / 12))
-    return frequency_hertz
+    return constants.MIDI_FREQUENCIES[midi_note]
 
 
-@simple_cache
+# letter names are a small, finite domain, so the cache is unbounded: with no maxsize
+# lru_cache skips its recency bookkeeping and each hit is a single dict lookup
+@lru_cache(maxsize=None)
 def letter_note_to_midi_note(letter_note):
     # type: (str) -> int
     note_part = iter(letter_note)
@@ -1,35 +1,38 @@
 import sys
+from types import MappingProxyType
 
 import pygame
+from typing import TYPE_CHECKING
 
-from python_synth.helpers import letter_note_to_midi_note
 from python_synth.processor import Processor
 from python_synth.synth import Synth
 
+if TYPE_CHECKING:
+    from typing import Dict  # noqa
+    from python_synth.synth import Note  # noqa
 
-KEYBOARD_NOTE_MAPPING = {
-    pygame.K_a: letter_note_to_midi_note('A4'),
-    pygame.K_w: letter_note_to_midi_note('A#4'),
-    pygame.K_s: letter_note_to_midi_note('B4'),
-    pygame.K_d: letter_note_to_midi_note('C5'),
-    pygame.K_r: letter_note_to_midi_note('C#5'),
-    pygame.K_f: letter_note_to_midi_note('D5'),
-    pygame.K_t: letter_note_to_midi_note('D#5'),
-    pygame.K_g: letter_note_to_midi_note('E5'),
-    pygame.K_h: letter_note_to_midi_note('F5'),
-    pygame.K_u: letter_note_to_midi_note('F#5'),
-    pygame.K_j: letter_note_to_midi_note('G5'),
-    pygame.K_i: letter_note_to_midi_note('G#5'),
-    pygame.K_k: letter_note_to_midi_note('A5'),
-    pygame.K_o: letter_note_to_midi_note('A#5'),
-    pygame.K_l: letter_note_to_midi_note('B5'),
-    pygame.K_SEMICOLON: letter_note_to_midi_note('C6'),
-    pygame.K_COLON: letter_note_to_midi_note('C6'),
-    pygame.K_COLON: letter_note_to_midi_note('C6'),
-    pygame.K_LEFTBRACKET: letter_note_to_midi_note('C6#'),
-    pygame.K_QUOTEDBL: letter_note_to_midi_note('D6'),
-    pygame.K_QUOTE: letter_note_to_midi_note('D6'),
-}
+
+# MIDI note numbers are precomputed, where C5 (middle-C) is 60
+KEYBOARD_NOTE_MAPPING = MappingProxyType({
+    pygame.K_a: 57,            # A4
+    pygame.K_w: 58,            # A#4
+    pygame.K_s: 59,            # B4
+    pygame.K_d: 60,            # C5
+    pygame.K_r: 61,            # C#5
+    pygame.K_f: 62,            # D5
+    pygame.K_t: 63,            # D#5
+    pygame.K_g: 64,            # E5
+    pygame.K_h: 65,            # F5
+    pygame.K_u: 66,            # F#5
+    pygame.K_j: 67,            # G5
+    pygame.K_i: 68,            # G#5
+    pygame.K_k: 69,            # A5
+    pygame.K_o: 70,            # A#5
+    pygame.K_l: 71,            # B5
+    pygame.K_SEMICOLON: 72,    # C6
+    pygame.K_LEFTBRACKET: 73,  # C#6
+    pygame.K_QUOTEDBL: 74,     # D6
+})
 
 
 def run():
@@ -37,6 +40,7 @@ def run():
     pygame.display.init()  # for some reason pygame events depend on this module
     synth = Synth()
     processor = Processor()
+    held_notes = {}  # type: Dict[int, Note]
 
     while True:
         event = pygame.event.wait()
@@ -49,17 +53,18 @@ def run():
             if event.key in KEYBOARD_NOTE_MAPPING:
                 midi_note = KEYBOARD_NOTE_MAPPING[event.key]
                 note = synth.get_note(midi_note)
-                processor.note_on(note)
+                # a note that was never queued must not be released later
+                if processor.note_on(note):
+                    held_notes[event.key] = note
 
             elif event.key in (pygame.K_ESCAPE, pygame.K_BACKSPACE):
                 pygame.quit()
                 sys.exit()
 
         elif event.type == pygame.KEYUP:
-            if event.key in KEYBOARD_NOTE_MAPPING:
-                midi_note = KEYBOARD_NOTE_MAPPING[event.key]
-                note = synth.get_note(midi_note)
-                processor.note_off(note)
+            # release the note this key started, rather than building a new one
+            if event.key in held_notes:
+                processor.note_off(held_notes.pop(event.key))
 
 
 if __name__ == '__main__':
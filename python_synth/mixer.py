@@ -0,0 +1,170 @@
+# coding: utf-8
+
+import math
+
+import numpy as np
+from typing import TYPE_CHECKING
+
+from python_synth.constants import ANALOGUE_MAX, SAMPLE_DTYPE, VOLUME_DTYPE
+from python_synth.settings import MAX_POLYPHONY
+
+if TYPE_CHECKING:
+    from typing import Callable  # noqa
+
+try:
+    import numba
+except ImportError:  # numba is optional: fall back to the NumPy mixer without it
+    numba = None
+
+
+def _mix_numpy(amplitudes, volumes, num_notes, out):
+    # type: (np.ndarray, np.ndarray, int, np.ndarray) -> None
+    """
+    Mix the first `num_notes` rows of `amplitudes` and `volumes` into `out`.
+    The result is the volume-weighted mean amplitude, scaled by the loudest note.
+    """
+    if not num_notes:
+        out.fill(0)
+        return
+
+    amplitudes = amplitudes[:num_notes]
+    volumes = volumes[:num_notes]
+
+    # einsum fuses the multiply-accumulate into one SIMD sum-of-products loop and
+    # never materializes the (num_notes, num_samples) product array
+    # NOTE: 16-bit amplitudes overflow int32 once scaled, so accumulate in int64
+    weighted_sum = np.einsum('ij,ij->j', amplitudes, volumes, dtype=np.int64)
+    volume_max = volumes.max(axis=0)
+    volume_sum = volumes.sum(axis=0, dtype=np.int64) * ANALOGUE_MAX
+
+    # silent samples have zero amplitude so only need guarding from div by zero
+    np.maximum(volume_sum, 1, out=volume_sum)
+    # floor of a float divide is exact here (see _mix_loop) and vectorizes, unlike //
+    mixed = np.true_divide(weighted_sum * volume_max, volume_sum)
+    out[:] = np.floor(mixed, out=mixed)
+
+
+def _mix_loop(amplitudes, volumes, num_notes, out):
+    # type: (np.ndarray, np.ndarray, int, np.ndarray) -> None
+    """
+    Equivalent to _mix_numpy, written as an explicit loop for Numba to compile.
+    A single pass over each sample avoids allocating any temporary arrays.
+    """
+    for sample_idx in range(out.shape[0]):
+        weighted_sum = 0
+        volume_sum = 0
+        volume_max = 0
+
+        for note_idx in range(num_notes):
+            # widen to 64-bit: scaled 16-bit amplitudes overflow int32
+            volume = int(volumes[note_idx, sample_idx])
+            weighted_sum += int(amplitudes[note_idx, sample_idx]) * volume
+            volume_sum += volume
+            if volume > volume_max:
+                volume_max = volume
+
+        if volume_sum:
+            # a float divide is several times cheaper than an int64 divide, and exact:
+            # both operands are well under 2**53, and the quotient's distance from the
+            # next integer is far larger than a float64 rounding error
+            weighted_volume = volume_sum * ANALOGUE_MAX
+            out[sample_idx] = math.floor(weighted_sum * volume_max / weighted_volume)
+        else:
+            out[sample_idx] = 0
+
+
+def _get_unrolled_kernel_source(num_notes):
+    # type: (int) -> str
+    """
+    Return the source of a copy of _mix_loop specialized for exactly `num_notes` notes.
+    With the inner loop unrolled, every note's volume can be held in a register.
+    """
+    note_idxs = range(num_notes)
+    volumes = ', '.join('volume_{}'.format(idx) for idx in note_idxs)
+    lines = [
+        'def _mix_{}(amplitudes, volumes, out):'.format(num_notes),
+        '    for sample_idx in range(out.shape[0]):',
+    ]
+    lines.extend(
+        '        volume_{0} = int(volumes[{0}, sample_idx])'.format(idx)
+        for idx in note_idxs
+    )
+    lines.extend([
+        '        weighted_sum = {}'.format(' + '.join(
+            'int(amplitudes[{0}, sample_idx]) * volume_{0}'.format(idx)
+            for idx in note_idxs
+        )),
+        '        volume_sum = {}'.format(volumes.replace(', ', ' + ')),
+        '        volume_max = {}'.format(
+            'max({})'.format(volumes) if num_notes > 1 else volumes
+        ),
+        '        if volume_sum:',
+        '            weighted_volume = volume_sum * ANALOGUE_MAX',
+        '            mixed = weighted_sum * volume_max / weighted_volume',
+        '            out[sample_idx] = math.floor(mixed)',
+        '        else:',
+        '            out[sample_idx] = 0',
+    ])
+    return '\n'.join(lines)
+
+
+def _get_unrolled_kernel(num_notes, decorator):
+    # type: (int, Callable[[Callable], Callable]) -> Callable
+    """
+    Compile the specialized kernel for `num_notes` and wrap it with `decorator`.
+    """
+    namespace = {'ANALOGUE_MAX': ANALOGUE_MAX, 'math': math}
+    exec(_get_unrolled_kernel_source(num_notes), namespace)
+    return decorator(namespace['_mix_{}'.format(num_notes)])
+
+
+def _mix_unrolled(amplitudes, volumes, num_notes, out):
+    # type: (np.ndarray, np.ndarray, int, np.ndarray) -> None
+    """
+    Dispatch to the kernel specialized for `num_notes`, or the generic kernel if there
+    are more notes than MAX_POLYPHONY.
+    """
+    if num_notes < len(_UNROLLED_KERNELS):
+        _UNROLLED_KERNELS[num_notes](amplitudes, volumes, out)
+    else:
+        _mix_loop_jit(amplitudes, volumes, num_notes, out)
+
+
+def _mix_silence(amplitudes, volumes, out):
+    # type: (np.ndarray, np.ndarray, np.ndarray) -> None
+    out.fill(0)
+
+
+if numba is not None:
+    # numba's fastmath=True includes 'arcp', which turns x / y into x * (1 / y). That can
+    # land one ulp below an exact integer quotient, so floor would round it down wrongly
+    _FASTMATH_FLAGS = {'nnan', 'ninf', 'nsz', 'contract', 'reassoc', 'afn'}
+
+    # an explicit signature compiles eagerly at import rather than in the audio thread
+    # nogil lets the PyAudio callback take the GIL while the fill thread is mixing
+    _mix_loop_jit = numba.njit(
+        'void({0}[:, :], {1}[:, :], int64, {0}[:])'.format(
+            SAMPLE_DTYPE.name,
+            VOLUME_DTYPE.name,
+        ),
+        cache=True,
+        fastmath=_FASTMATH_FLAGS,
+        nogil=True,
+    )(_mix_loop)
+
+    # generated kernels have no source file, so they cannot use numba's disk cache
+    _unrolled_jit = numba.njit(
+        'void({0}[:, :], {1}[:, :], {0}[:])'.format(
+            SAMPLE_DTYPE.name,
+            VOLUME_DTYPE.name,
+        ),
+        fastmath=_FASTMATH_FLAGS,
+        nogil=True,
+    )
+    _UNROLLED_KERNELS = [_mix_silence] + [
+        _get_unrolled_kernel(num_notes, _unrolled_jit)
+        for num_notes in range(1, MAX_POLYPHONY + 1)
+    ]
+    mix = _mix_unrolled
+else:
+    mix = _mix_numpy
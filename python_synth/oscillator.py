@@ -0,0 +1,58 @@
+# coding: utf-8
+
+import numpy as np
+
+from python_synth.constants import SAMPLE_DTYPE
+
+try:
+    import numba
+except ImportError:  # numba is optional: fall back to the NumPy oscillator without it
+    numba = None
+
+
+def _oscillate_numpy(wavetable, phase, phase_step, out):
+    # type: (np.ndarray, float, float, np.ndarray) -> float
+    """
+    Fill `out` by stepping through `wavetable` from `phase` by `phase_step` samples
+    at a time, wrapping at the end of each cycle. Returns the phase to resume from.
+
+    The wavetable length must be a power of two, so that phases wrap with a bit mask
+    rather than an integer modulo.
+    """
+    num_samples = len(out)
+    wavetable_mask = len(wavetable) - 1
+    phases = phase + phase_step * np.arange(num_samples)
+    phase_idx = phases.astype(np.intp) & wavetable_mask
+    np.take(wavetable, phase_idx, out=out, mode='clip')
+    return (phase + phase_step * num_samples) % len(wavetable)
+
+
+def _oscillate_loop(wavetable, phase, phase_step, out):
+    # type: (np.ndarray, float, float, np.ndarray) -> float
+    """
+    Equivalent to _oscillate_numpy, written as an explicit loop for Numba to compile.
+    Each index is computed and used in a register, so no phase arrays are allocated.
+    """
+    num_samples = out.shape[0]
+    wavetable_size = wavetable.shape[0]
+    wavetable_mask = wavetable_size - 1
+    for sample_idx in range(num_samples):
+        wavetable_idx = int(phase + phase_step * sample_idx) & wavetable_mask
+        out[sample_idx] = wavetable[wavetable_idx]
+    return (phase + phase_step * num_samples) % wavetable_size
+
+
+if numba is not None:
+    # wavetables are shared read-only arrays, which numba types separately
+    _sample_type = numba.from_dtype(SAMPLE_DTYPE)
+    _wavetable_type = numba.types.Array(_sample_type, 1, 'C', readonly=True)
+
+    # an explicit signature compiles eagerly at import rather than in the audio thread
+    # NOTE: no fastmath, since reassociating the phase sum can shift the sample read
+    oscillate = numba.njit(
+        numba.float64(_wavetable_type, numba.float64, numba.float64, _sample_type[:]),
+        cache=True,
+        nogil=True,
+    )(_oscillate_loop)
+else:
+    oscillate = _oscillate_numpy
@@ -1,28 +1,34 @@
 # coding: utf-8
-from __future__ import division
 
 import attr
 import functools
-from collections import deque
+import numpy as np
+import time
 
 from typing import TYPE_CHECKING
 
 from python_synth import helpers
-from python_synth.constants import ANALOGUE_MAX, NOTE_EVENTS, SAMPLE_BYTE_WIDTH
+from python_synth.buffers import EventRing
+from python_synth.constants import (
+    NOTE_OFF,
+    NOTE_ON,
+    SAMPLE_BYTE_WIDTH,
+    SAMPLE_DTYPE,
+    VOLUME_DTYPE,
+)
+from python_synth.mixer import mix
 from python_synth.settings import (
     EVENT_QUEUE_MAX_SIZE,
+    MAX_POLYPHONY,
     NUM_AUDIO_CHANNELS,
     SAMPLES_PER_SECOND,
 )
 
 if TYPE_CHECKING:
-    from typing import Any, Dict, Iterable, Tuple  # noqa
-
+    from typing import Any, Dict, Iterable, List  # noqa
 
-@attr.attrs(slots=True, frozen=True)
-class NoteEvent(object):
-    event_type = attr.attrib()  # type: str
-    note = attr.attrib()        # type: Note
+# how long note_off waits before retrying when the event queue is full
+EVENT_QUEUE_RETRY_SECONDS = 0.001
 
 
 @attr.attrs
@@ -35,13 +41,9 @@ class Processor(object):
     __weakref__ = attr.ib(init=False, hash=False, repr=False, cmp=False)
 
     _stream = attr.attrib(init=False)
-    _notes_event_queue = attr.attrib(  # type: deque
+    _notes_event_queue = attr.attrib(  # type: EventRing
         init=False,
-        default=attr.Factory(functools.partial(deque, maxlen=EVENT_QUEUE_MAX_SIZE)),
-    )
-    _notes = attr.attrib(  # type: Dict[int, Note]
-        init=False,
-        default=attr.Factory(dict),
+        default=attr.Factory(functools.partial(EventRing, EVENT_QUEUE_MAX_SIZE)),
     )
 
     def __attrs_post_init__(self, *args, **kwargs):
@@ -55,69 +57,111 @@ class Processor(object):
 
     def note_on(self, note):
         """
-        Add a new Note to the queue.
+        Add a new Note to the queue. Returns False, without queueing the note, if the
+        event queue is full; callers must not send a NOTE_OFF for a rejected note.
         """
-        # type: (Note) -> None
-        note_on_event = NoteEvent(event_type=NOTE_EVENTS['NOTE_ON'], note=note)
-        self._notes_event_queue.append(note_on_event)
+        # type: (Note) -> bool
+        return self._notes_event_queue.put((NOTE_ON, note))
 
     def note_off(self, note):
         """
         Schedule an existing Note to be removed from the queue.
+
+        Dropping a NOTE_OFF would leave its note sounding forever, so if the event
+        queue is full this waits for the sample generator to drain it, which it does
+        once per audio chunk.
         """
         # type: (Note) -> None
-        note_off_event = NoteEvent(event_type=NOTE_EVENTS['NOTE_OFF'], note=note)
-        self._notes_event_queue.append(note_off_event)
+        while not self._notes_event_queue.put((NOTE_OFF, note)):
+            time.sleep(EVENT_QUEUE_RETRY_SECONDS)
 
-    def sample_generator(self):
+    def sample_generator(self, chunk_size):
         """
-        Loop through active notes and generate a stream of samples.
+        Loop through active notes and generate a stream of audio chunks.
+
+        Each chunk is an array of `chunk_size` frames of signed 16-bit samples, shaped
+        (chunk_size, NUM_AUDIO_CHANNELS) when there is more than one channel so that
+        its bytes are interleaved as PortAudio expects. Notes are rendered a chunk at a
+        time and mixed by a compiled (or vectorized) kernel, rather than one
+        Python-level iteration per sample.
+
+        NOTE: the same array is reused for every chunk, so consumers must copy it out
+        before advancing the generator.
+
+        Note events are only processed at chunk boundaries, so a key press takes effect
+        at most one chunk (~21ms at 1024 samples and 48kHz) after it is queued.
         """
-        # type: () -> Iterable[int]
-        notes_on = set()  # type: Set[Note]
-        dead_notes = set()  # type: Set[Note]
+        # type: (int) -> Iterable[np.ndarray]
+        notes_on = []  # type: List[Note]
+
+        # preallocate buffers which are reused for every block
+        buffer_shape = (MAX_POLYPHONY, chunk_size)
+        note_amplitudes = np.zeros(buffer_shape, dtype=SAMPLE_DTYPE)
+        note_volumes = np.zeros(buffer_shape, dtype=VOLUME_DTYPE)
+        sample_block = np.empty(chunk_size, dtype=SAMPLE_DTYPE)
+
+        # the mix is mono, so every channel of a frame gets the same sample
+        if NUM_AUDIO_CHANNELS == 1:
+            frame_block = sample_block
+        else:
+            frame_shape = (chunk_size, NUM_AUDIO_CHANNELS)
+            frame_block = np.empty(frame_shape, dtype=SAMPLE_DTYPE)
+
+        # bind per-block lookups to locals once, including a view of every buffer row,
+        # so the loop below doesn't re-resolve attributes or slice out new row views
+        notes_event_queue = self._notes_event_queue
+        process_note_events = self._process_note_events
+        amplitude_rows = list(note_amplitudes)
+        volume_rows = list(note_volumes)
 
         while True:
-            sample_volume_max = 0
-            sample_volume_sum = 0
-            sample_amplitudes = 0
-
-            # process the note event queue until empty
-            while self._notes_event_queue:
-                note_event = self._notes_event_queue.popleft()
-
-                if note_event.event_type == NOTE_EVENTS['NOTE_ON']:
-                    note = note_event.note
-                    note.set_key_down()
-                    self._notes[note.midi_note] = note
-                    notes_on.add(note)
-
-                if note_event.event_type == NOTE_EVENTS['NOTE_OFF']:
-                    note = self._notes.pop(note_event.note.midi_note)
-                    note.set_key_up()
-
-            # clear any notes that have ended
-            if dead_notes:
-                for note in dead_notes:
+            # most blocks have no events, so skip creating the drain generator for them
+            if notes_event_queue:
+                process_note_events(notes_on)
+
+            # grow the note buffers if more notes are held than MAX_POLYPHONY
+            if len(notes_on) > len(note_amplitudes):
+                buffer_shape = (len(notes_on), chunk_size)
+                note_amplitudes = np.zeros(buffer_shape, dtype=SAMPLE_DTYPE)
+                note_volumes = np.zeros(buffer_shape, dtype=VOLUME_DTYPE)
+                amplitude_rows = list(note_amplitudes)
+                volume_rows = list(note_volumes)
+
+            # then render each active note into its own row of the note buffers
+            any_ended = False
+            for note, amplitudes, volumes in zip(notes_on, amplitude_rows, volume_rows):
+                note.render(amplitudes, volumes)
+                any_ended = any_ended or note.is_off
+
+            mix(note_amplitudes, note_volumes, len(notes_on), sample_block)
+
+            # clear any notes that have ended, which only happens on a few blocks
+            if any_ended:
+                notes_on[:] = [note for note in notes_on if not note.is_off]
+
+            # interleave channels with a single broadcast copy
+            if frame_block is not sample_block:
+                frame_block[:] = sample_block[:, np.newaxis]
+
+            yield frame_block
+
+    def _process_note_events(self, notes_on):
+        """
+        Apply every note event queued since the last chunk to the list of active notes.
+        Events are plain (event_type, note) tuples to keep the keyboard path cheap.
+        """
+        # type: (List[Note]) -> None
+        for event_type, note in self._notes_event_queue.drain():
+            if event_type == NOTE_ON:
+                note.set_key_down()
+                notes_on.append(note)
+
+            elif event_type == NOTE_OFF:
+                # a note that never started, or has already ended, has nothing to release
+                if note.is_off:
+                    continue
+
+                note.set_key_up()
+                # notes without a release are off already, so don't render them at all
+                if note.is_off:
                     notes_on.remove(note)
-                dead_notes.clear()
-
-            # then play each active note
-            for note in notes_on:
-                try:
-                    note_sample = next(note)
-                except StopIteration:
-                    dead_notes.add(note)
-
-                sample_volume_sum += note_sample.volume
-                sample_amplitudes += note_sample.volume * note_sample.amplitude
-
-                if note_sample.volume > sample_volume_max:
-                    sample_volume_max = note_sample.volume
-
-            if sample_volume_sum:
-                weighted_amplitude = sample_amplitudes * sample_volume_max
-                weighted_volume = sample_volume_sum * ANALOGUE_MAX
-                yield weighted_amplitude // weighted_volume + 127
-            else:
-                yield 127
@@ -24,8 +24,8 @@ def run():
             processor.note_off(note)
 
         note = synth.get_note(midi_note)
-        processor.note_on(note)
-        notes_on.append(note)
+        if processor.note_on(note):
+            notes_on.append(note)
         time.sleep(NOTE_DELAY_SECONDS)
 
     for note in notes_on:
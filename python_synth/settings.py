@@ -17,7 +17,8 @@ SAMPLE_BIT_DEPTH_OPTIONS = {
 BUFFER_MS = 100
 AUDIO_STREAM_CHUNK_SIZE = 1024  # AKA "frames per buffer"
 SAMPLES_PER_SECOND = SAMPLES_PER_SECOND_OPTIONS['DIGITAL_STANDARD']
-SAMPLE_BIT_DEPTH = SAMPLE_BIT_DEPTH_OPTIONS['8_BIT']
+SAMPLE_BIT_DEPTH = SAMPLE_BIT_DEPTH_OPTIONS['16_BIT']
 NUM_AUDIO_CHANNELS = 1  # e.g. 1=mono; 2=stereo
 EVENT_QUEUE_MAX_SIZE = 127
 MAX_POLYPHONY = 8  # num notes that can be played simultaneously
+FAST_SINE = False  # build wavetables with a polynomial sine rather than np.sin
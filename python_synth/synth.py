@@ -1,23 +1,35 @@
 # coding: utf-8
-from __future__ import division
 
-import math
-import random
 from abc import ABCMeta, abstractmethod
+from functools import lru_cache
 
 import attr
-import six
-from typing import NamedTuple, TYPE_CHECKING
-from six.moves import range
+import numpy as np
+from typing import TYPE_CHECKING
 
 from python_synth import helpers
-from python_synth.constants import ADSR_STATUS, ANALOGUE_MAX
-from python_synth.exceptions import SynthError
-from python_synth.settings import SAMPLES_PER_SECOND
-from python_synth.validators import validate_analogue, validate_milliseconds
+from python_synth.constants import (
+    ADSR_ATTACK,
+    ADSR_DECAY,
+    ADSR_OFF,
+    ADSR_RELEASE,
+    ADSR_SUSTAIN,
+    AMPLITUDE_MAX,
+    ANALOGUE_MAX,
+    MIDI_FREQUENCIES,
+    SAMPLE_DTYPE,
+    VOLUME_DTYPE,
+)
+from python_synth.oscillator import oscillate
+from python_synth.settings import FAST_SINE, SAMPLES_PER_SECOND
+from python_synth.validators import (
+    validate_analogue,
+    validate_midi_note,
+    validate_milliseconds,
+)
 
 if TYPE_CHECKING:
-    from typing import Any, Dict, Iterable, Tuple  # noqa
+    from typing import Any, Dict, Iterable, List, Tuple  # noqa
 
 
 DEFAULT_ATTACK_MS = 100
@@ -25,44 +37,37 @@ DEFAULT_DECAY_MS = 100
 DEFAULT_RELEASE_MS = 100
 DEFAULT_SUSTAIN_LEVEL = 200
 
-
-"""
-A Note object produces a stream of NoteSamples. A sample is generally described only
-by its amplitude, but when combining multiple samples one must also know the *volume*
-of each. The result amplitude is a weighted average of individual amplitudes weighted
-by the volume.
-
-NOTE: instantiating a NamedTuple is 2X slower than a builtin tuple. The added clarity
-is worth it for now, but should be changed in a future optimization.
-"""
-NoteSample = NamedTuple(
-    'NoteSample',
-    [
-        ('amplitude', int),  # int between SAMPLE_BIT_DEPTH/-2 and SAMPLE_BIT_DEPTH/2
-        ('volume', int),     # int between ANALOG_MIN and ANALOG_MAX
-    ],
-)
+# samples in the one-cycle sine wavetable shared by all notes
+# NOTE: must be a power of two, since the oscillator wraps phases with a bit mask
+SINE_WAVETABLE_SIZE = 4096
 
 
-@attr.s(slots=True, hash=True)
+@attr.s(slots=True, cmp=False)
 class Note(object):
     """
-    A Note is an iterator that returns NoteSamples. There will be one Note for every time
-    a key is pressed on the keyboard.
+    A Note renders blocks of samples. There will be one Note for every time a key is
+    pressed on the keyboard.
+
+    A sample is generally described only by its amplitude, but when combining multiple
+    samples one must also know the *volume* of each. The result amplitude is a weighted
+    average of individual amplitudes weighted by the volume.
 
     Note objects should only be created via the `get_note` method on an Instrument class.
-    It is the Instrument's job to provision the Note with a `sample_generator`.
+    It is the Instrument's job to provision the Note with a `wavetable`: a NumPy array
+    holding exactly one cycle of the waveform. The Note steps through it with a
+    fractional phase accumulator at whatever rate plays the cycle at its pitch, so one
+    table can serve every note.
 
-    Keep in mind that any mutable attribute in the class *must* be excluded from
-    comparison with cmp=False, or else the class won't hash properly.
+    Every key press creates a distinct Note, so Notes compare and hash by identity.
 
     # TODO: add support for velocity (and decide how it links to ADSR)
     """
-    midi_note = attr.ib()  # type: int
-    sample_generator = attr.ib(
+    midi_note = attr.ib(
+        validator=validate_midi_note,
+    )  # type: int
+    wavetable = attr.ib(
         repr=None,
-        cmp=False,
-    )  # type: Iterable[int]
+    )  # type: np.ndarray
 
     # adsr public methods
     attack_ms = attr.ib(
@@ -83,29 +88,27 @@ class Note(object):
     )  # type: int
 
     # private attributes set on initialization
-    _sample_idx = attr.ib(init=None, cmp=False)          # type: int
-    _release_sample_idx = attr.ib(init=None, cmp=False)  # type: int
-    _volume = attr.ib(init=None, cmp=False)              # type: int
-    _adsr_status = attr.ib(init=None, cmp=False)         # type: int
+    _sample_idx = attr.ib(init=None)          # type: int
+    _phase = attr.ib(init=None)               # type: float
+    _phase_step = attr.ib(init=None)          # type: float
+    _release_sample_idx = attr.ib(init=None)  # type: int
+    _volume = attr.ib(init=None)              # type: int
+    _adsr_status = attr.ib(init=None)         # type: int
 
     # computed volume envelopes
-    _sample_idx_volume_map = attr.ib(
+    _envelope = attr.ib(
         init=None,
         repr=None,
-        cmp=False,
-    )  # type: Dict[int, int]
-    _release_sample_idx_volume_map = attr.ib(
+    )  # type: np.ndarray
+    _release_envelope = attr.ib(
         init=None,
         repr=None,
-        cmp=False,
-    )  # type: Dict[int, int]
+    )  # type: np.ndarray
 
     # ADSR constants
-    _num_attack_samples = attr.ib(init=None, repr=None, cmp=False)   # type: int
-    _num_decay_samples = attr.ib(init=None, repr=None, cmp=False)    # type: int
-    _num_release_samples = attr.ib(init=None, repr=None, cmp=False)  # type: int
-    _decay_start_idx = attr.ib(init=None, repr=None, cmp=False)      # type: int
-    _sustain_start_idx = attr.ib(init=None, repr=None, cmp=False)    # type: int
+    _num_attack_samples = attr.ib(init=None, repr=None)   # type: int
+    _num_decay_samples = attr.ib(init=None, repr=None)    # type: int
+    _num_release_samples = attr.ib(init=None, repr=None)  # type: int
 
     def __attrs_post_init__(self, *args, **kwargs):
         """
@@ -113,246 +116,181 @@ class Note(object):
         """
         # type: (*List[Any],  **Dict[Any]) -> None
         self._sample_idx = 0
+        self._phase = 0.0
         self._release_sample_idx = 0
         self._volume = 0
-        self._adsr_status = ADSR_STATUS['OFF']
+        self._adsr_status = ADSR_OFF
+
+        # wavetable samples to advance per output sample to play at this note's pitch
+        cycles_per_second = MIDI_FREQUENCIES[self.midi_note]
+        self._phase_step = len(self.wavetable) * cycles_per_second / SAMPLES_PER_SECOND
 
         # precalculate useful ADSR values
         self._num_attack_samples = (self.attack_ms * SAMPLES_PER_SECOND) // 1000
         self._num_decay_samples = (self.decay_ms * SAMPLES_PER_SECOND) // 1000
         self._num_release_samples = (self.release_ms * SAMPLES_PER_SECOND) // 1000
-        self._decay_start_idx = self._num_attack_samples + 1
-        self._sustain_start_idx = self._decay_start_idx + self._num_decay_samples
 
-        # precompute volume envelope changes
-        self._sample_idx_volume_map = self._get_sample_idx_volume_map(
+        # precompute volume envelopes
+        self._envelope = self._get_envelope(
             self._num_attack_samples,
             self._num_decay_samples,
             self.sustain_level,
         )
-        self._release_sample_idx_volume_map = {}
-
-    def __iter__(self):
-        """
-        Implementing __iter__ defines this class as an iterator.
-        """
-        # type: () => Note
-        return self
-
-    def __next__(self):
-        """
-        For Python 2 compatibility. Alias of self.next.
-        """
-        # type: () -> NoteSample
-        return self.next()
+        # most notes are released while sustaining, so build that release envelope now
+        # rather than at key up, which is handled in the audio thread
+        self._release_envelope = self._get_release_envelope(
+            self._num_release_samples,
+            self.sustain_level,
+        )
 
-    def __hash__(self):
+    @property
+    def is_off(self):
         """
-        Notes are always unique: return a random 64-bit integer.
+        True once the note has finished its release and stopped producing samples.
         """
-        # type: () -> int
-        return random.randint(0, 2**64)
+        # type: () -> bool
+        return self._adsr_status == ADSR_OFF
 
     def set_key_down(self):
         """
         Activate note when keyboard key is pressed.
-        This must be called *before* iterating through samples.
+        This must be called *before* rendering any samples.
         """
         # type: () -> None
-        self._adsr_status = ADSR_STATUS['ATTACK']
+        self._adsr_status = ADSR_ATTACK
 
     def set_key_up(self):
         """
         Release note when keyboard key is raised.
         """
         # type: () -> None
-        self._adsr_status = ADSR_STATUS['RELEASE']
-        self._release_sample_idx_volume_map = self._get_release_sample_idx_volume_map(
-            self.release_ms,
-            self._volume,
-        )
-
-    def next(self):
+        # a repeated key up must not restart a release that is already under way
+        if self._adsr_status == ADSR_RELEASE:
+            return
+
+        # with no release the note ends now, rather than after a block of silence
+        if not self._num_release_samples:
+            self._adsr_status = ADSR_OFF
+            return
+
+        self._adsr_status = ADSR_RELEASE
+        if self._volume != self.sustain_level:
+            self._release_envelope = self._get_release_envelope(
+                self._num_release_samples,
+                self._volume,
+            )
+
+    def render(self, amplitudes, volumes):
         """
-        Return the next NoteSample or raise StopIteration.
+        Render the next block of samples in place into the given amplitude and volume
+        arrays, which must be the same length. Amplitudes must be SAMPLE_DTYPE to match
+        the wavetable. Writing into caller-owned buffers means no output arrays are
+        allocated per block. If the note ends partway through the block the remainder
+        is zero-filled.
         """
-        # type: () -> NoteSample
-        sample = next(self.sample_generator)
-        volume = self._volume
-
-        # increment indices
-        if self._adsr_status == ADSR_STATUS['RELEASE']:
-            self._release_sample_idx += 1
-        self._sample_idx += 1
-
-        # update ADSR status for next iteration
-        next_adsr_status = self._get_new_adsr_status(
-            self._adsr_status,
-            self._sample_idx,
-            self._release_sample_idx,
-            self._decay_start_idx,
-            self._sustain_start_idx,
-            self._num_release_samples,
-        )
-        if next_adsr_status is not None:
-            self._adsr_status = next_adsr_status
-            if next_adsr_status == ADSR_STATUS['OFF']:
-                raise StopIteration()
-
-        # update volume for next iteration
-        next_volume = self._get_new_volume(
-            self._sample_idx,
-            self._release_sample_idx,
-            self._sample_idx_volume_map,
-            self._release_sample_idx_volume_map,
-            self._adsr_status,
-            self.sustain_level,
+        # type: (np.ndarray, np.ndarray) -> None
+        num_samples = len(amplitudes)
+
+        if self._adsr_status == ADSR_OFF:
+            amplitudes.fill(0)
+            volumes.fill(0)
+            return
+
+        # release: play out the release envelope then turn the note off
+        if self._adsr_status == ADSR_RELEASE:
+            start_idx = self._release_sample_idx
+            end_idx = min(start_idx + num_samples, len(self._release_envelope))
+            num_rendered = end_idx - start_idx
+            volumes[:num_rendered] = self._release_envelope[start_idx:end_idx]
+            volumes[num_rendered:] = 0
+            self._release_sample_idx = end_idx
+            if end_idx == len(self._release_envelope):
+                self._adsr_status = ADSR_OFF
+
+        # attack, decay & sustain: hold at the sustain level past the end of the envelope
+        else:
+            start_idx = min(self._sample_idx, len(self._envelope))
+            end_idx = min(self._sample_idx + num_samples, len(self._envelope))
+            num_enveloped = end_idx - start_idx
+            volumes[:num_enveloped] = self._envelope[start_idx:end_idx]
+            volumes[num_enveloped:] = self.sustain_level
+            num_rendered = num_samples
+            self._sample_idx += num_samples
+            self._adsr_status = self._get_adsr_status(
+                self._sample_idx,
+                self._num_attack_samples,
+                self._num_decay_samples,
+            )
+
+        if num_rendered:
+            self._volume = int(volumes[num_rendered - 1])
+
+        # read from the wavetable straight into the output, wrapping at each cycle end
+        self._phase = oscillate(
+            self.wavetable,
+            self._phase,
+            self._phase_step,
+            amplitudes[:num_rendered],
         )
-        if next_volume is not None:
-            self._volume = next_volume
-
-        return NoteSample(sample, volume)
+        amplitudes[num_rendered:] = 0
 
     @staticmethod
-    def _get_new_volume(
-        sample_idx,                     # type: int
-        release_sample_idx,             # type: int
-        sample_idx_volume_map,          # type: Dict[int, int]
-        release_sample_idx_volume_map,  # type: Dict[int, int]
-        adsr_status,                    # type: int
-        sustain_level,                  # type: int
-    ):
+    def _get_adsr_status(sample_idx, num_attack_samples, num_decay_samples):
+        # type: (int, int, int) -> int
         """
-        Return the volume for the given sample index.
+        Return the ADSR status of a held note at the given sample index.
         """
-        # type: (...) -> Optional[int]
-        if sample_idx in sample_idx_volume_map:
-            return sample_idx_volume_map[sample_idx]
-
-        if release_sample_idx in release_sample_idx_volume_map:
-            return release_sample_idx_volume_map[release_sample_idx]
-
-        if adsr_status == ADSR_STATUS['OFF']:
-            raise SynthError('volume cannot change while note is off')
+        if sample_idx < num_attack_samples:
+            return ADSR_ATTACK
+        if sample_idx < num_attack_samples + num_decay_samples:
+            return ADSR_DECAY
+        return ADSR_SUSTAIN
 
     @staticmethod
-    def _get_new_adsr_status(
-        old_adsr_status,      # type: int
-        sample_idx,           # type: int
-        release_sample_idx,   # type: int
-        decay_start_idx,      # type: int
-        sustain_start_idx,    # type: int
-        num_release_samples,  # type: int
-    ):
-        """
-        Return the ADSR status for the given sample index.
+    @lru_cache(maxsize=32)
+    def _get_envelope(num_attack_samples, num_decay_samples, sustain_level):
+        # type: (int, int, int) -> np.ndarray
         """
-        # type: (...) -> int
-        if old_adsr_status == ADSR_STATUS['ATTACK']:
-            if sample_idx == decay_start_idx:
-                return ADSR_STATUS['DECAY']
-
-        if old_adsr_status == ADSR_STATUS['DECAY']:
-            if sample_idx == sustain_start_idx:
-                return ADSR_STATUS['SUSTAIN']
-
-        if old_adsr_status == ADSR_STATUS['RELEASE']:
-            if release_sample_idx == num_release_samples:
-                return ADSR_STATUS['OFF']
+        Return an array with the volume of each sample of the attack and decay. Once the
+        envelope runs out the note holds at the sustain level until it is released.
 
-        if old_adsr_status == ADSR_STATUS['OFF']:
-            raise SynthError('ADSR cannot change while note is off')
-
-    @staticmethod
-    def _get_sample_idx_volume_map(num_attack_samples, num_decay_samples, sustain_level):
-        # type: (int, int, int) -> Dict[int, int]
-        """
-        Return a dict of {sample_idx: volume} where each entry represents a volume change
-        at the given sample. Anything that can be precomputed, should be, this included.
+        Notes with the same ADSR settings share one cached, read-only envelope.
 
         # TODO: make this nonlinear
         """
-        volume_map = {}  # Dict[int, int]
-        attack_sustain_volume_diff = ANALOGUE_MAX - sustain_level
-
-        # case: attack has more samples than volume changes
-        if num_attack_samples > ANALOGUE_MAX:
-            samples_per_volume_increase = num_attack_samples // ANALOGUE_MAX
-
-            for volume in range(ANALOGUE_MAX + 1):
-                sample_idx = volume * samples_per_volume_increase
-                volume_map[sample_idx] = volume
-
-        # case: attack has fewer samples than volume changes
-        else:
-            volume_increase_per_sample = ANALOGUE_MAX // num_attack_samples
-
-            for sample_idx in range(num_attack_samples):
-                volume = sample_idx * volume_increase_per_sample
-                volume_map[sample_idx] = volume
-
-        # case: no decay
-        if attack_sustain_volume_diff == 0:
-            return volume_map
-
-        # case: decay has more samples than volume changes
-        if num_decay_samples > attack_sustain_volume_diff:
-            samples_per_volume_decrease = num_decay_samples // attack_sustain_volume_diff
-
-            for volume in range(ANALOGUE_MAX, sustain_level - 1, -1):
-                decay_idx = samples_per_volume_decrease * (ANALOGUE_MAX - volume)
-                sample_idx = decay_idx + num_attack_samples
-                volume_map[sample_idx] = volume
-
-        # case: decay has fewer samples than volume changes
-        else:
-            volume_decrease_per_sample = attack_sustain_volume_diff // num_decay_samples
-
-            for sample_idx in range(num_decay_samples):
-                volume = ANALOGUE_MAX - (sample_idx * volume_decrease_per_sample)
-                volume_map[sample_idx] = volume
-
-        return volume_map
+        attack = np.linspace(0, ANALOGUE_MAX, num_attack_samples, endpoint=False)
+        decay = np.linspace(
+            ANALOGUE_MAX,
+            sustain_level,
+            num_decay_samples,
+            endpoint=False,
+        )
+        envelope = np.concatenate((attack, decay)).astype(VOLUME_DTYPE)
+        envelope.flags.writeable = False
+        return envelope
 
     @staticmethod
-    def _get_release_sample_idx_volume_map(release_ms, start_volume):
+    @lru_cache(maxsize=256)
+    def _get_release_envelope(num_release_samples, start_volume):
+        # type: (int, int) -> np.ndarray
         """
-        Return a dict of {sample_idx: volume} where each entry represents a volume change
-        at the given sample. This cannot be computed until the KEY_UP event is received.
+        Return an array with the volume of each sample of the release. This cannot be
+        computed until the KEY_UP event is received, but is cached by start volume.
 
         # TODO: make this nonlinear
         """
-        # type: (int, int) -> Dict[int, int]
-        volume_map = {}  # Dict[int, int]
-        num_release_samples = (release_ms * SAMPLES_PER_SECOND) // 1000
-
-        # no further changes needed if volume is already at 0
-        if start_volume == 0:
-            return volume_map
-
-        # release: more samples than volume changes
-        if num_release_samples > start_volume:
-            samples_per_volume_decrease = num_release_samples // start_volume
-
-            for volume in range(start_volume, -1, -1):
-                sample_idx = samples_per_volume_decrease * (start_volume - volume)
-                volume_map[sample_idx] = volume
-
-        # release: fewer samples than volume changes
-        else:
-            volume_decrease_per_sample = start_volume // num_release_samples
-
-            for sample_idx in range(num_release_samples):
-                volume = start_volume - (sample_idx * volume_decrease_per_sample)
-                volume_map[sample_idx] = volume
-
-        return volume_map
+        envelope = np.linspace(start_volume, 0, num_release_samples)
+        envelope = envelope.astype(VOLUME_DTYPE)
+        envelope.flags.writeable = False
+        return envelope
 
 
 @attr.attrs(slots=True)
-@six.add_metaclass(ABCMeta)
-class Instrument(object):
-    volume = attr.attrib(default=255)  # type: int
+class Instrument(object, metaclass=ABCMeta):
+    volume = attr.attrib(
+        default=ANALOGUE_MAX,
+        validator=validate_analogue,
+    )  # type: int
 
     @abstractmethod
     def get_note(self, midi_note, **kwargs):
@@ -362,31 +300,36 @@ class Instrument(object):
 
 @attr.attrs(slots=True)
 class Synth(Instrument):
+    """
+    A sine wave instrument. Its wavetable is built for the volume it is created with.
+    """
+    _wavetable = attr.attrib(init=False, repr=False)  # type: np.ndarray
 
-    @staticmethod
-    def get_note(midi_note, **kwargs):
+    def __attrs_post_init__(self, *args, **kwargs):
+        # type: (*List[Any],  **Dict[Any]) -> None
+        # build the table up front so that a key press never has to
+        self._wavetable = _get_sine_wavetable(self.volume)
+
+    def get_note(self, midi_note, **kwargs):
         # type: (int, **Any) -> Note
+        return Note(midi_note, self._wavetable, **kwargs)
 
-        @helpers.simple_cache
-        def sample_generator(midi_note):
-            # type: () -> Iterable[int]
-            sample_amplitude_array = []  # type: List[int]
-            cycles_per_second = helpers.midi_note_to_frequency(midi_note)
-            samples_per_cycle = int(SAMPLES_PER_SECOND // cycles_per_second)
-
-            for sample_idx in range(samples_per_cycle):
-                # "normalize" the idx of this sample as a float between 0 and 1
-                normalized_idx = sample_idx / samples_per_cycle
-                # calculate the amplitude for this frame as a float between -1 and 1
-                # NOTE: this could be approximated for better performance
-                relative_amplitide = math.sin(normalized_idx * 2 * math.pi)
-                # scale the amplitude to an integer between 0 and 255 (inclusive)
-                scaled_amplitude = int(relative_amplitide * 127)
-                # add amplitude to byte array
-                sample_amplitude_array.append(scaled_amplitude)
-
-            while True:
-                for sample_amplitude in sample_amplitude_array:
-                    yield sample_amplitude
-
-        return Note(midi_note, sample_generator(midi_note), **kwargs)
+
+@lru_cache(maxsize=16)
+def _get_sine_wavetable(volume):
+    # type: (int) -> np.ndarray
+    """
+    Return one high-resolution cycle of a sine wave, with its peak amplitude scaled by
+    the instrument volume (between ANALOGUE_MIN and ANALOGUE_MAX).
+    Every note plays from the same table, so it stays resident in cache.
+    """
+    # compute the whole cycle with one vectorized call rather than a math.sin per sample
+    sin = helpers.fast_sin if FAST_SINE else np.sin
+    sample_idx = np.arange(SINE_WAVETABLE_SIZE, dtype=np.float32)
+    relative_amplitudes = sin(sample_idx * (2 * np.pi / SINE_WAVETABLE_SIZE))
+    peak_amplitude = AMPLITUDE_MAX * volume / ANALOGUE_MAX
+    wavetable = (relative_amplitudes * peak_amplitude).astype(SAMPLE_DTYPE)
+
+    # the same array is shared by every Note, so guard it against modification
+    wavetable.flags.writeable = False
+    return wavetable
@@ -1,6 +1,11 @@
 from typing import TYPE_CHECKING
 
-from python_synth.constants import ANALOGUE_MIN, ANALOGUE_MAX
+from python_synth.constants import (
+    ANALOGUE_MIN,
+    ANALOGUE_MAX,
+    MIDI_NOTE_MIN,
+    MIDI_NOTE_MAX,
+)
 from python_synth.exceptions import SynthValidationError
 
 if TYPE_CHECKING:
@@ -21,3 +26,12 @@ def validate_milliseconds(instance, attribute, value):
     # type: (Any, attr.Attribute, int)
     if value < 0:
         raise SynthValidationError('milliseconds must be positive integers')
+
+
+def validate_midi_note(instance, attribute, value):
+    # type: (Any, attr.Attribute, int)
+    if value < MIDI_NOTE_MIN or value > MIDI_NOTE_MAX:
+        raise SynthValidationError(
+            'MIDI notes must be between {} and {}'
+            .format(MIDI_NOTE_MIN, MIDI_NOTE_MAX)
+        )